@@ -1,10 +1,13 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
-import plotly.express as px
-import plotly.graph_objects as go
-from snowflake.snowpark import Session
+import hashlib
+import hmac
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # Configure page
 st.set_page_config(
@@ -13,128 +16,286 @@ st.set_page_config(
     layout="wide"
 )
 
-def get_snowflake_session():
-    """Get Snowflake session using Streamlit connection"""
-    try:
-        session = st.connection("snowflake").session()
-        return session
-    except Exception as e:
-        st.error(f"Failed to connect to Snowflake: {e}")
-        return None
+# Seconds between SELECT 1 probes of the shared session
+SESSION_PROBE_INTERVAL = 60
 
-def get_visitor_stats(session, hours_back=24):
-    """Get visitor statistics for the specified time period"""
-    try:
-        # Get visitor count and trends
-        stats_query = f"""
-        SELECT 
-            COUNT(*) as total_visitors,
-            COUNT(DISTINCT DATE_TRUNC('hour', TIMESTAMP)) as active_hours,
-            AVG(AI_TOKENS_USED) as avg_tokens_used,
-            MODE(ARCHETYPE) as most_popular_archetype,
-            MODE(PROFESSIONAL_STYLE) as most_common_style,
-            MODE(PERSONALITY_TRAITS) as most_common_trait
-        FROM SUPERHERO_VISITORS 
-        WHERE TIMESTAMP >= DATEADD('hour', -{hours_back}, CURRENT_TIMESTAMP())
-        """
-        
-        result = session.sql(stats_query).collect()
-        return result[0] if result else None
-        
-    except Exception as e:
-        st.error(f"Error fetching visitor stats: {e}")
-        return None
+@st.cache_resource(show_spinner=False)
+def _create_snowflake_session():
+    """Create a Snowflake session shared across reruns and users
+    
+    Kept together with the time it last answered a query, so liveness
+    probes can be throttled.
+    """
+    return {'session': st.connection("snowflake").session(), 'checked_at': time.time()}
 
-def get_hourly_trends(session, hours_back=24):
-    """Get hourly visitor trends"""
+def _is_alive(session):
+    """Check whether the session can still run a query
+    
+    is_closed() only reports an explicit close(), not an expired token or a
+    dropped network link, so this runs a real round-trip.
+    """
     try:
-        trends_query = f"""
-        SELECT 
-            DATE_TRUNC('hour', TIMESTAMP) as hour,
-            COUNT(*) as visitor_count,
-            COUNT(DISTINCT PROFESSIONAL_STYLE) as style_diversity,
-            AVG(AI_TOKENS_USED) as avg_tokens
-        FROM SUPERHERO_VISITORS 
-        WHERE TIMESTAMP >= DATEADD('hour', -{hours_back}, CURRENT_TIMESTAMP())
-        GROUP BY DATE_TRUNC('hour', TIMESTAMP)
-        ORDER BY hour DESC
-        """
-        
-        result = session.sql(trends_query).collect()
-        return pd.DataFrame([row.asDict() for row in result]) if result else pd.DataFrame()
-        
-    except Exception as e:
-        st.error(f"Error fetching hourly trends: {e}")
-        return pd.DataFrame()
+        session.sql("SELECT 1").collect()
+        return True
+    except Exception:
+        return False
 
-def get_archetype_distribution(session, hours_back=24):
-    """Get distribution of superhero archetypes"""
-    try:
-        archetype_query = f"""
-        SELECT 
-            ARCHETYPE,
-            COUNT(*) as count,
-            ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER(), 1) as percentage
+def get_snowflake_session():
+    """Get the cached Snowflake session, rebuilding it if the connection dropped
+    
+    The session is probed at most once every SESSION_PROBE_INTERVAL seconds,
+    so most reruns make no extra round-trip.
+    """
+    cached = _create_snowflake_session()
+    if time.time() - cached['checked_at'] < SESSION_PROBE_INTERVAL:
+        return cached['session']
+    
+    if _is_alive(cached['session']):
+        cached['checked_at'] = time.time()
+    else:
+        # The connection object caches the raw connection; reset it so the
+        # rebuilt session actually reconnects
+        st.connection("snowflake").reset()
+        _create_snowflake_session.clear()
+        cached = _create_snowflake_session()
+    return cached['session']
+
+def get_cutoff_timestamp(hours_back):
+    """Get the start of the lookback window, truncated to the minute
+    
+    Queries bind this value instead of calling CURRENT_TIMESTAMP(), which
+    keeps the query stable within a minute so Snowflake can answer repeated
+    dashboard loads from its result cache.
+    """
+    now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    return (now - timedelta(hours=hours_back)).isoformat()
+
+# Columns returned for each KIND row of the combined dashboard query
+STATS_COLUMNS = [
+    'TOTAL_VISITORS', 'ACTIVE_HOURS', 'AVG_TOKENS_USED',
+    'MOST_POPULAR_ARCHETYPE', 'MOST_COMMON_STYLE', 'MOST_COMMON_TRAIT'
+]
+HOURLY_COLUMNS = ['HOUR', 'VISITOR_COUNT', 'STYLE_DIVERSITY', 'AVG_TOKENS']
+ARCHETYPE_COLUMNS = ['ARCHETYPE', 'COUNT', 'PERCENTAGE']
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_dashboard_metrics(_session, cutoff):
+    """Get visitor stats, hourly trends and archetype distribution in one query
+    
+    All three share the same time window, so the window is scanned once in a
+    CTE and each result set is tagged with a KIND column, then split in Python.
+    Returns a (visitor_stats, hourly_trends, archetype_dist) tuple. Errors are
+    raised to the caller (and not cached) so the next load retries.
+    """
+    metrics_query = """
+    WITH window_visitors AS (
+        SELECT *
         FROM SUPERHERO_VISITORS 
-        WHERE TIMESTAMP >= DATEADD('hour', -{hours_back}, CURRENT_TIMESTAMP())
-        GROUP BY ARCHETYPE
-        ORDER BY count DESC
-        """
-        
-        result = session.sql(archetype_query).collect()
-        return pd.DataFrame([row.asDict() for row in result]) if result else pd.DataFrame()
-        
-    except Exception as e:
-        st.error(f"Error fetching archetype distribution: {e}")
-        return pd.DataFrame()
+        WHERE TIMESTAMP >= ?::TIMESTAMP_LTZ
+    )
+    SELECT 
+        'stats' as kind,
+        COUNT(*) as total_visitors,
+        COUNT(DISTINCT DATE_TRUNC('hour', TIMESTAMP)) as active_hours,
+        AVG(AI_TOKENS_USED) as avg_tokens_used,
+        MODE(ARCHETYPE) as most_popular_archetype,
+        MODE(PROFESSIONAL_STYLE) as most_common_style,
+        MODE(PERSONALITY_TRAITS) as most_common_trait,
+        NULL::TIMESTAMP as hour,
+        NULL::NUMBER as visitor_count,
+        NULL::NUMBER as style_diversity,
+        NULL::FLOAT as avg_tokens,
+        NULL::STRING as archetype,
+        NULL::NUMBER as count,
+        NULL::FLOAT as percentage
+    FROM window_visitors
+    UNION ALL
+    SELECT 
+        'hourly', NULL, NULL, NULL, NULL, NULL, NULL,
+        DATE_TRUNC('hour', TIMESTAMP),
+        COUNT(*),
+        COUNT(DISTINCT PROFESSIONAL_STYLE),
+        AVG(AI_TOKENS_USED),
+        NULL, NULL, NULL
+    FROM window_visitors
+    GROUP BY DATE_TRUNC('hour', TIMESTAMP)
+    UNION ALL
+    SELECT 
+        'archetype', NULL, NULL, NULL, NULL, NULL, NULL,
+        NULL, NULL, NULL, NULL,
+        ARCHETYPE,
+        COUNT(*),
+        ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER(), 1)
+    FROM window_visitors
+    GROUP BY ARCHETYPE
+    """
+    
+    metrics = _session.sql(metrics_query, params=[cutoff]).to_pandas()
+    return split_dashboard_metrics(metrics)
 
-def get_recent_visitors(session, limit=10):
-    """Get most recent visitors with their superhero identities"""
+def split_dashboard_metrics(metrics):
+    """Split the combined metrics frame back into the three dashboard datasets"""
+    if metrics.empty:
+        return None, pd.DataFrame(), pd.DataFrame()
+    
+    stats_rows = metrics.loc[metrics['KIND'] == 'stats', STATS_COLUMNS]
+    visitor_stats = None
+    if not stats_rows.empty:
+        # Union columns come back nullable; restore the None/int values the metrics expect
+        visitor_stats = {
+            key: (None if pd.isna(value) else value)
+            for key, value in stats_rows.iloc[0].items()
+        }
+        visitor_stats['TOTAL_VISITORS'] = int(visitor_stats['TOTAL_VISITORS'])
+        visitor_stats['ACTIVE_HOURS'] = int(visitor_stats['ACTIVE_HOURS'])
+    
+    hourly_trends = (
+        metrics.loc[metrics['KIND'] == 'hourly', HOURLY_COLUMNS]
+        .astype({'VISITOR_COUNT': int, 'STYLE_DIVERSITY': int})
+        .sort_values('HOUR', ascending=False)
+        .reset_index(drop=True)
+    )
+    
+    archetype_dist = (
+        metrics.loc[metrics['KIND'] == 'archetype', ARCHETYPE_COLUMNS]
+        .astype({'COUNT': int})
+        .sort_values('COUNT', ascending=False)
+        .reset_index(drop=True)
+    )
+    
+    return visitor_stats, hourly_trends, archetype_dist
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_recent_visitors(_session, cutoff, limit=10):
+    """Get most recent visitors in the time window with their superhero identities"""
+    recent_query = """
+    SELECT 
+        TO_CHAR(TIMESTAMP, 'HH24:MI:SS') as "Time",
+        SUPERHERO_NAME as "Hero Name",
+        SUPERPOWER as "Superpower",
+        ARCHETYPE as "Type",
+        PROFESSIONAL_STYLE as "Style",
+        PERSONALITY_TRAITS as "Traits"
+    FROM SUPERHERO_VISITORS 
+    WHERE TIMESTAMP >= ?::TIMESTAMP_LTZ
+    ORDER BY TIMESTAMP DESC
+    LIMIT ?
+    """
+    
+    return _session.sql(recent_query, params=[cutoff, limit]).to_pandas()
+
+def export_visitors_csv(session):
+    """Export all visitors as CSV, writing result batches as they arrive
+    
+    Returns a BytesIO positioned at the start, which st.download_button reads
+    directly, so the CSV is never copied into a second string.
+    """
     try:
-        recent_query = f"""
+        export_query = """
         SELECT 
+            VISIT_ID,
             TIMESTAMP,
             SUPERHERO_NAME,
             SUPERPOWER,
             ARCHETYPE,
             PROFESSIONAL_STYLE,
-            PERSONALITY_TRAITS
+            PERSONALITY_TRAITS,
+            AI_TOKENS_USED
         FROM SUPERHERO_VISITORS 
         ORDER BY TIMESTAMP DESC
-        LIMIT {limit}
         """
         
-        result = session.sql(recent_query).collect()
-        return pd.DataFrame([row.asDict() for row in result]) if result else pd.DataFrame()
+        buffer = io.BytesIO()
+        for i, batch in enumerate(session.sql(export_query).to_pandas_batches()):
+            batch.to_csv(buffer, index=False, header=(i == 0), encoding='utf-8')
+        buffer.seek(0)
+        return buffer
         
     except Exception as e:
-        st.error(f"Error fetching recent visitors: {e}")
-        return pd.DataFrame()
+        st.error(f"Error exporting visitors: {e}")
+        return None
+
+def load_dashboard_data(session, hours_back=24):
+    """Run the independent dashboard queries concurrently on the shared session"""
+    cutoff = get_cutoff_timestamp(hours_back)
+    ctx = get_script_run_ctx()
+    
+    def attach_script_context():
+        # Give the cached query helpers the script context in worker threads
+        add_script_run_ctx(threading.current_thread(), ctx)
+    
+    # Fallback per query, so one failure doesn't blank the whole dashboard
+    fallbacks = {
+        'metrics': (None, pd.DataFrame(), pd.DataFrame()),
+        'recent_visitors': pd.DataFrame(),
+    }
+    
+    with ThreadPoolExecutor(max_workers=2, initializer=attach_script_context) as executor:
+        futures = {
+            executor.submit(get_dashboard_metrics, session, cutoff): 'metrics',
+            executor.submit(get_recent_visitors, session, cutoff): 'recent_visitors',
+        }
+        results = {}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                # Rendered here rather than in the cached helpers, so errors
+                # aren't replayed from the cache
+                st.error(f"Error fetching {name.replace('_', ' ')}: {e}")
+                results[name] = fallbacks[name]
+    
+    visitor_stats, hourly_trends, archetype_dist = results['metrics']
+    return {
+        'visitor_stats': visitor_stats,
+        'hourly_trends': hourly_trends,
+        'archetype_dist': archetype_dist,
+        'recent_visitors': results['recent_visitors'],
+    }
+
+# SHA-256 of the demo password; set ADMIN_PASSWORD_SHA256 in secrets to override
+DEFAULT_ADMIN_PASSWORD_SHA256 = "ba85a04ee48d2461b59dabfbc154ad3c43bbf31a1c1d47357bf722e966ab481f"
+
+def check_admin_password(password):
+    """Compare the password's SHA-256 against the expected hash in constant time"""
+    try:
+        expected_hash = st.secrets["ADMIN_PASSWORD_SHA256"]
+    except (KeyError, FileNotFoundError):
+        expected_hash = DEFAULT_ADMIN_PASSWORD_SHA256
+    
+    password_hash = hashlib.sha256(password.encode()).hexdigest()
+    return hmac.compare_digest(password_hash, expected_hash)
 
 # Admin Authentication (simple password protection)
 if 'authenticated' not in st.session_state:
     st.session_state.authenticated = False
 
 if not st.session_state.authenticated:
-    st.title("🔐 Booth Staff Access")
-    password = st.text_input("Enter admin password:", type="password")
+    login_form = st.empty()
+    with login_form.container():
+        st.title("🔐 Booth Staff Access")
+        password = st.text_input("Enter admin password:", type="password")
+        login_clicked = st.button("Login")
     
-    if st.button("Login"):
-        if password == "snowflake2024":  # Simple password for demo
-            st.session_state.authenticated = True
-            st.rerun()
-        else:
+    if login_clicked and check_admin_password(password):
+        # Render the dashboard in this run instead of rerunning the script
+        st.session_state.authenticated = True
+        login_form.empty()
+    else:
+        if login_clicked:
             st.error("Incorrect password")
-    st.stop()
+        st.stop()
 
 # Main Dashboard
 st.title("📊 Snowflake World Tour - Booth Analytics Dashboard")
 st.markdown("**Real-time visitor engagement and superhero generation insights**")
 
 # Get Snowflake session
-session = get_snowflake_session()
-if not session:
-    st.error("Unable to connect to database")
+try:
+    session = get_snowflake_session()
+except Exception as e:
+    st.error(f"Unable to connect to database: {e}")
     st.stop()
 
 # Dashboard controls
@@ -143,15 +304,18 @@ with col1:
     hours_back = st.selectbox("Time Period", [1, 4, 8, 24, 48], index=3, help="Hours to look back")
 with col2:
     if st.button("🔄 Refresh Data"):
+        get_dashboard_metrics.clear()
+        get_recent_visitors.clear()
         st.rerun()
 with col3:
     st.metric("Status", "🟢 Live", help="Dashboard is connected and updating")
 
 # Get data
-visitor_stats = get_visitor_stats(session, hours_back)
-hourly_trends = get_hourly_trends(session, hours_back)
-archetype_dist = get_archetype_distribution(session, hours_back)
-recent_visitors = get_recent_visitors(session)
+dashboard_data = load_dashboard_data(session, hours_back)
+visitor_stats = dashboard_data['visitor_stats']
+hourly_trends = dashboard_data['hourly_trends']
+archetype_dist = dashboard_data['archetype_dist']
+recent_visitors = dashboard_data['recent_visitors']
 
 # Key Metrics Row
 if visitor_stats:
@@ -201,14 +365,20 @@ col1, col2 = st.columns(2)
 with col1:
     st.subheader("📈 Visitor Trends")
     if not hourly_trends.empty:
-        fig = px.line(
-            hourly_trends, 
-            x='HOUR', 
-            y='VISITOR_COUNT',
+        import plotly.graph_objects as go
+        
+        fig = go.Figure(go.Scatter(
+            x=hourly_trends['HOUR'].to_numpy(),
+            y=hourly_trends['VISITOR_COUNT'].to_numpy(),
+            mode='lines',
+            name='Visitors'
+        ))
+        fig.update_layout(
             title=f"Visitors per Hour (Last {hours_back}h)",
-            labels={'VISITOR_COUNT': 'Visitors', 'HOUR': 'Time'}
+            xaxis_title='Time',
+            yaxis_title='Visitors',
+            height=400
         )
-        fig.update_layout(height=400)
         st.plotly_chart(fig, use_container_width=True)
     else:
         st.info("No visitor data available for the selected time period")
@@ -216,13 +386,13 @@ with col1:
 with col2:
     st.subheader("🦸‍♂️ Superhero Types")
     if not archetype_dist.empty:
-        fig = px.pie(
-            archetype_dist, 
-            values='COUNT', 
-            names='ARCHETYPE',
-            title="Superhero Archetype Distribution"
-        )
-        fig.update_layout(height=400)
+        import plotly.graph_objects as go
+        
+        fig = go.Figure(go.Pie(
+            labels=archetype_dist['ARCHETYPE'].to_numpy(),
+            values=archetype_dist['COUNT'].to_numpy()
+        ))
+        fig.update_layout(title="Superhero Archetype Distribution", height=400)
         st.plotly_chart(fig, use_container_width=True)
     else:
         st.info("No archetype data available")
@@ -235,20 +405,9 @@ col1, col2 = st.columns([2, 1])
 with col1:
     st.subheader("🕐 Recent Visitors")
     if not recent_visitors.empty:
-        # Format the dataframe for display
-        display_df = recent_visitors.copy()
-        display_df['TIMESTAMP'] = pd.to_datetime(display_df['TIMESTAMP']).dt.strftime('%H:%M:%S')
-        display_df = display_df.rename(columns={
-            'TIMESTAMP': 'Time',
-            'SUPERHERO_NAME': 'Hero Name',
-            'SUPERPOWER': 'Superpower',
-            'ARCHETYPE': 'Type',
-            'PROFESSIONAL_STYLE': 'Style',
-            'PERSONALITY_TRAITS': 'Traits'
-        })
-        
+        # Columns are already formatted and labelled by the query
         st.dataframe(
-            display_df,
+            recent_visitors,
             use_container_width=True,
             hide_index=True,
             height=300
@@ -265,8 +424,8 @@ with col2:
         st.success("URL ready to share!")
     
     if st.button("💾 Export Data", use_container_width=True):
-        if not recent_visitors.empty:
-            csv = recent_visitors.to_csv(index=False)
+        csv = export_visitors_csv(session)
+        if csv and csv.getbuffer().nbytes:
             st.download_button(
                 "Download CSV",
                 csv,
@@ -274,7 +433,7 @@ with col2:
                 "text/csv",
                 use_container_width=True
             )
-        else:
+        elif csv is not None:
             st.warning("No data to export")
     
     if st.button("🔄 Reset Session", use_container_width=True):
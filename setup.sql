@@ -61,38 +61,34 @@ CREATE STAGE IF NOT EXISTS superhero_stage
 -- Clear existing archetype data (for clean setup)
 DELETE FROM SUPERHERO_ARCHETYPES;
 
--- Insert superhero archetypes using INSERT ... SELECT with PARSE_JSON
+-- Insert superhero archetypes in a single INSERT ... SELECT with PARSE_JSON
+-- (one statement, one compile, instead of one INSERT per archetype)
 INSERT INTO SUPERHERO_ARCHETYPES (ARCHETYPE_ID, ARCHETYPE_NAME, DESCRIPTION, TRAITS_VECTOR, SAMPLE_NAMES, SAMPLE_POWERS)
 SELECT 
     'wizard', 'Data Wizard', 'Analytical and transformative', 'analytical, precise, transformative', 
     PARSE_JSON('["The Schema Sage", "Query Quantum", "The Data Whisperer"]'), 
-    PARSE_JSON('["Transforms messy data with a glance", "Processes petabytes in milliseconds"]');
-
-INSERT INTO SUPERHERO_ARCHETYPES (ARCHETYPE_ID, ARCHETYPE_NAME, DESCRIPTION, TRAITS_VECTOR, SAMPLE_NAMES, SAMPLE_POWERS)
+    PARSE_JSON('["Transforms messy data with a glance", "Processes petabytes in milliseconds"]')
+UNION ALL
 SELECT 
     'commander', 'Cloud Commander', 'Leadership and scalable', 'leadership, scalable, reliable',
     PARSE_JSON('["Elastico", "The Scale Master", "Cloud Conductor"]'), 
-    PARSE_JSON('["Scales infinitely without breaking a sweat", "Commands any cloud workload"]');
-
-INSERT INTO SUPERHERO_ARCHETYPES (ARCHETYPE_ID, ARCHETYPE_NAME, DESCRIPTION, TRAITS_VECTOR, SAMPLE_NAMES, SAMPLE_POWERS)
+    PARSE_JSON('["Scales infinitely without breaking a sweat", "Commands any cloud workload"]')
+UNION ALL
 SELECT 
     'oracle', 'AI Oracle', 'Predictive and insightful', 'predictive, insightful, forward-thinking',
     PARSE_JSON('["Cortex Commander", "ML Maverick", "The Algorithm Alchemist"]'), 
-    PARSE_JSON('["Predicts future trends with 99.9% accuracy", "Builds ML models at the speed of thought"]');
-
-INSERT INTO SUPERHERO_ARCHETYPES (ARCHETYPE_ID, ARCHETYPE_NAME, DESCRIPTION, TRAITS_VECTOR, SAMPLE_NAMES, SAMPLE_POWERS)
+    PARSE_JSON('["Predicts future trends with 99.9% accuracy", "Builds ML models at the speed of thought"]')
+UNION ALL
 SELECT 
     'ninja', 'Query Ninja', 'Fast and efficient', 'fast, efficient, problem-solving',
     PARSE_JSON('["Zero-Copy Captain", "Compute Optimizer", "The Concurrency Guardian"]'), 
-    PARSE_JSON('["Optimizes any query instantly", "Handles massive concurrency effortlessly"]');
-
-INSERT INTO SUPERHERO_ARCHETYPES (ARCHETYPE_ID, ARCHETYPE_NAME, DESCRIPTION, TRAITS_VECTOR, SAMPLE_NAMES, SAMPLE_POWERS)
+    PARSE_JSON('["Optimizes any query instantly", "Handles massive concurrency effortlessly"]')
+UNION ALL
 SELECT 
     'guardian', 'Security Guardian', 'Protective and governance-focused', 'security, governance, compliance, trust',
     PARSE_JSON('["The Encryption Emperor", "Privacy Protector", "Compliance Commander"]'), 
-    PARSE_JSON('["Protects data with unbreakable encryption", "Detects threats before they materialize"]');
-
-INSERT INTO SUPERHERO_ARCHETYPES (ARCHETYPE_ID, ARCHETYPE_NAME, DESCRIPTION, TRAITS_VECTOR, SAMPLE_NAMES, SAMPLE_POWERS)
+    PARSE_JSON('["Protects data with unbreakable encryption", "Detects threats before they materialize"]')
+UNION ALL
 SELECT 
     'architect', 'Data Architect', 'Design-focused and structural', 'architecture, design, planning, structure',
     PARSE_JSON('["Schema Sage", "Design Deity", "Structure Savant"]'), 
@@ -1,16 +1,15 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
 from PIL import Image
-import base64
 import io
-import uuid
+import logging
+import random
+import secrets
+import threading
 import time
+import uuid
 import json
-from datetime import datetime
-import snowflake.snowpark as snowpark
-from snowflake.snowpark import Session
-from snowflake.snowpark.functions import col, lit, call_builtin
+from collections import Counter
+from pathlib import Path
 
 # Configure page
 st.set_page_config(
@@ -21,63 +20,12 @@ st.set_page_config(
 )
 
 # Custom CSS for booth-ready professional styling
-st.markdown("""
-<style>
-    .main-header {
-        text-align: center;
-        padding: 2rem 0;
-        background: linear-gradient(135deg, #29B5E8 0%, #1E3A8A 100%);
-        margin: -1rem -1rem 2rem -1rem;
-        color: white;
-        border-radius: 0 0 20px 20px;
-    }
-    .superhero-card {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 2rem;
-        border-radius: 20px;
-        color: white;
-        text-align: center;
-        margin: 2rem 0;
-        box-shadow: 0 10px 30px rgba(0,0,0,0.3);
-    }
-    .power-badge {
-        background: rgba(255,255,255,0.2);
-        padding: 1rem;
-        border-radius: 15px;
-        margin: 1rem 0;
-        backdrop-filter: blur(10px);
-    }
-    .camera-container {
-        text-align: center;
-        padding: 2rem;
-        background: #f8fafc;
-        border-radius: 15px;
-        margin: 1rem 0;
-    }
-    .brand-footer {
-        text-align: center;
-        padding: 2rem;
-        background: #1e293b;
-        color: white;
-        margin: 2rem -1rem -1rem -1rem;
-        border-radius: 20px 20px 0 0;
-    }
-    .stButton > button {
-        background: linear-gradient(135deg, #29B5E8 0%, #1E3A8A 100%);
-        color: white;
-        border: none;
-        border-radius: 25px;
-        padding: 0.75rem 2rem;
-        font-size: 1.1rem;
-        font-weight: bold;
-        transition: all 0.3s ease;
-    }
-    .stButton > button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 5px 15px rgba(41, 181, 232, 0.4);
-    }
-</style>
-""", unsafe_allow_html=True)
+@st.cache_data(show_spinner=False)
+def load_css():
+    """Read the booth stylesheet once instead of on every rerun"""
+    return (Path(__file__).parent / "styles.css").read_text()
+
+st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
 
 # Initialize session state
 if 'session_id' not in st.session_state:
@@ -87,167 +35,330 @@ if 'superhero_generated' not in st.session_state:
 if 'photo_taken' not in st.session_state:
     st.session_state.photo_taken = False
 
-def get_snowflake_session():
-    """Get Snowflake session using Streamlit connection"""
-    try:
-        session = st.connection("snowflake").session()
-        return session
-    except Exception as e:
-        st.error(f"Failed to connect to Snowflake: {e}")
-        return None
+logger = logging.getLogger(__name__)
 
-def check_database_connection():
-    """Check if database connection is working and tables exist"""
-    session = get_snowflake_session()
-    if not session:
-        return False
+# Photos are analyzed at most this size
+PHOTO_MAX_SIZE = (512, 512)
+
+# Event metadata stored with every visitor row
+SESSION_DATA_JSON = json.dumps({"booth": "accenture", "event": "snowflake_world_tour"})
+
+# Prompt template; {placeholders} are filled in SQL from the classification
+IDENTITY_PROMPT_TEMPLATE = """Create a Snowflake Data Cloud superhero for someone with {style} style and {traits} traits. 
+The name should relate to data, AI, cloud computing, or analytics. Be creative and professional. 
+The superpower should match their {traits} personality and focus on Snowflake capabilities like scaling, performance, AI, or data governance. 
+Make it exciting and relevant to data professionals. 
+Return "name" with only the superhero name and "power" with only the superpower description."""
+
+# Classify the staged photo, then generate name and superpower with a single
+# structured-output AI_COMPLETE call. Binds: stage path, prompt template.
+SUPERHERO_GENERATION_SQL = """
+WITH photo_analysis AS (
+    SELECT TO_FILE(?) AS img
+),
+classification AS (
+    SELECT
+        COALESCE(AI_CLASSIFY(img, ['professional', 'casual', 'creative', 'technical']):labels[0]::STRING, 'professional') AS professional_style,
+        COALESCE(AI_CLASSIFY(img, ['confident', 'analytical', 'innovative', 'collaborative', 'focused', 'dynamic']):labels[0]::STRING, 'analytical') AS personality_traits
+    FROM photo_analysis
+),
+hero_identity AS (
+    SELECT
+        professional_style,
+        personality_traits,
+        PARSE_JSON(AI_COMPLETE(
+            model => 'llama3.1-70b',
+            prompt => REPLACE(REPLACE(?, '{style}', professional_style), '{traits}', personality_traits),
+            model_parameters => {'max_tokens': 250},
+            response_format => {
+                'type': 'json',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'name': {'type': 'string'},
+                        'power': {'type': 'string'}
+                    },
+                    'required': ['name', 'power']
+                }
+            }
+        )::STRING) AS hero
+    FROM classification
+)
+SELECT
+    professional_style,
+    personality_traits,
+    hero:name::STRING AS superhero_name,
+    hero:power::STRING AS superpower
+FROM hero_identity
+"""
+
+# Seconds between SELECT 1 probes of the shared session
+SESSION_PROBE_INTERVAL = 60
+
+@st.cache_resource(show_spinner=False)
+def _create_snowflake_session():
+    """Create a Snowflake session shared across reruns and users
     
+    Kept together with the time it last answered a query, so liveness
+    probes can be throttled.
+    """
+    return {'session': st.connection("snowflake").session(), 'checked_at': time.time()}
+
+def _is_alive(session):
+    """Check whether the session can still run a query
+    
+    is_closed() only reports an explicit close(), not an expired token or a
+    dropped network link, so this runs a real round-trip.
+    """
     try:
-        # Check if required tables exist
-        result = session.sql("SHOW TABLES LIKE 'SUPERHERO_%'").collect()
-        required_tables = {'SUPERHERO_VISITORS', 'SUPERHERO_ARCHETYPES'}
-        existing_tables = {row['name'].upper() for row in result}
-        
-        if not required_tables.issubset(existing_tables):
-            missing_tables = required_tables - existing_tables
-            st.error(f"Missing database tables: {', '.join(missing_tables)}. Please run setup.sql first.")
-            return False
-        
+        session.sql("SELECT 1").collect()
         return True
-    except Exception as e:
-        st.error(f"Database connection failed: {e}")
+    except Exception:
         return False
 
-def analyze_photo_with_ai(image_data):
-    """Use Cortex AISQL to analyze the photo and generate superhero identity
+def get_snowflake_session():
+    """Get the cached Snowflake session, rebuilding it if the connection dropped
+    
+    The session is probed at most once every SESSION_PROBE_INTERVAL seconds,
+    so most reruns make no extra round-trip.
+    """
+    cached = _create_snowflake_session()
+    if time.time() - cached['checked_at'] < SESSION_PROBE_INTERVAL:
+        return cached['session']
+    
+    if _is_alive(cached['session']):
+        cached['checked_at'] = time.time()
+    else:
+        # The connection object caches the raw connection; reset it so the
+        # rebuilt session actually reconnects
+        st.connection("snowflake").reset()
+        _create_snowflake_session.clear()
+        cached = _create_snowflake_session()
+    return cached['session']
+
+@st.cache_data(ttl=300, show_spinner=False)
+def check_database_connection(_session):
+    """Check that the required tables exist
+    
+    The schema rarely changes during an event, so the answer is cached for
+    five minutes instead of running SHOW TABLES on every rerun. Only success
+    is cached: missing tables raise, like any other error, so the check runs
+    again on the next rerun until setup.sql has been applied.
+    """
+    result = _session.sql("SHOW TABLES LIKE 'SUPERHERO_%'").collect()
+    required_tables = {'SUPERHERO_VISITORS', 'SUPERHERO_ARCHETYPES'}
+    existing_tables = {row['name'].upper() for row in result}
+    
+    missing_tables = required_tables - existing_tables
+    if missing_tables:
+        raise LookupError(f"Missing database tables: {', '.join(sorted(missing_tables))}. Please run setup.sql first.")
+    
+    return True
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_archetypes(_session):
+    """Load superhero archetype names (static seed data from setup.sql)"""
+    result = _session.sql("SELECT ARCHETYPE_NAME FROM SUPERHERO_ARCHETYPES").collect()
+    return [row['ARCHETYPE_NAME'] for row in result]
+
+@st.cache_resource
+def get_visitor_counter():
+    """Today's visitor tally, shared by every browser session in this process"""
+    return {'day_ends_at': 0, 'total': 0, 'by_archetype': Counter(), 'lock': threading.Lock()}
+
+def _roll_visitor_counter(session, counter):
+    """Start the tally for a new day from the visitors already saved today
+    
+    Runs once per day per process. The day boundary comes from Snowflake's
+    CURRENT_DATE() (the account timezone), not the container clock, so it
+    matches the seed query. The query runs outside counter['lock'].
+    """
+    if time.time() < counter['day_ends_at']:
+        return
+    result = session.sql("""
+    SELECT
+        DATE_PART(epoch_second, DATEADD(day, 1, CURRENT_DATE())::TIMESTAMP_LTZ) AS DAY_ENDS_AT,
+        OBJECT_AGG(ARCHETYPE, VISITORS) AS BY_ARCHETYPE
+    FROM (
+        SELECT ARCHETYPE, COUNT(*) AS VISITORS
+        FROM SUPERHERO_VISITORS
+        WHERE DATE(TIMESTAMP) = CURRENT_DATE()
+        GROUP BY ARCHETYPE
+    )
+    """).collect()[0]
+    by_archetype = Counter(json.loads(result['BY_ARCHETYPE'] or '{}'))
+    with counter['lock']:
+        counter['by_archetype'] = by_archetype
+        counter['total'] = sum(by_archetype.values())
+        counter['day_ends_at'] = float(result['DAY_ENDS_AT'])
+
+def count_visitor(archetype):
+    """Add a saved visitor to today's tally
+    
+    Never queries Snowflake: a stale tally is left alone, and the visitor is
+    picked up from SUPERHERO_VISITORS when the next day's tally is seeded.
+    """
+    counter = get_visitor_counter()
+    with counter['lock']:
+        if time.time() < counter['day_ends_at']:
+            counter['total'] += 1
+            counter['by_archetype'][archetype] += 1
+
+def get_today_stats(session):
+    """Get today's visitor analytics for booth staff
+    
+    Served from the in-process tally kept by save_visitor_data, so the
+    analytics button doesn't query Snowflake.
+    """
+    counter = get_visitor_counter()
+    _roll_visitor_counter(session, counter)
+    with counter['lock']:
+        most_common = counter['by_archetype'].most_common(1)
+        return {
+            'TOTAL_VISITORS': counter['total'],
+            'UNIQUE_ARCHETYPES': len(counter['by_archetype']),
+            'MOST_POPULAR_ARCHETYPE': most_common[0][0] if most_common else None
+        }
+
+def load_photo(photo_bytes):
+    """Decode raw photo bytes, downscaled to PHOTO_MAX_SIZE
+    
+    JPEG draft mode lets PIL decode directly at a reduced scale instead of
+    decoding the full-resolution camera image and resizing it afterwards.
+    """
+    image = Image.open(io.BytesIO(photo_bytes))
+    image.draft('RGB', PHOTO_MAX_SIZE)
+    image.thumbnail(PHOTO_MAX_SIZE, Image.LANCZOS)
+    return image
+
+def prepare_photo_upload(photo):
+    """Re-encode the downscaled photo as a compact JPEG for the stage
+    
+    AI_CLASSIFY doesn't need full resolution, and uploading a multi-megabyte
+    phone photo is the slowest step of the pipeline.
+    """
+    buffer = io.BytesIO()
+    photo.convert('RGB').save(buffer, 'JPEG', quality=85, optimize=True)
+    buffer.seek(0)
+    return buffer
+
+def remove_staged_photo(session, stage_path):
+    """Remove an analyzed photo from the stage (runs on a background thread)"""
+    try:
+        session.sql(f"REMOVE '{stage_path}'").collect()
+    except Exception:
+        pass  # Ignore cleanup errors
+
+def photo_fingerprint(photo):
+    """Perceptual difference hash (dHash) of a photo as 16 hex characters
+    
+    Repeat or near-duplicate shots of the same person produce the same hash,
+    unlike a hash of the raw bytes.
+    """
+    pixels = list(photo.convert('L').resize((9, 8), Image.LANCZOS).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{bits:016x}"
+
+def _generate_superhero(session, photo):
+    """Classify the photo and generate its superhero identity with Cortex AISQL
+    
+    Errors propagate so the caller can fall back.
     
     Prerequisites: 
     - photo_analysis_stage must exist (created by setup.sql)
     - SUPERHERO_ARCHETYPES table must be populated
     """
-    session = get_snowflake_session()
-    if not session:
-        return None
+    # Real AI analysis using Snowflake Cortex AI_CLASSIFY
+    
+    # Create a unique filename for this photo
+    photo_id = secrets.token_hex(4)
+    
+    # Use existing photo_analysis_stage (created by setup.sql)
+    stage_path = f"@photo_analysis_stage/superhero_photo_{photo_id}.jpg"
     
     try:
-        # Real AI analysis using Snowflake Cortex AI_CLASSIFY
-        import uuid
-        import tempfile
-        import os
-        
-        # Create a unique filename for this photo
-        photo_id = str(uuid.uuid4())[:8]
-        filename = f"superhero_photo_{photo_id}.jpg"
-        
-        # Use existing photo_analysis_stage (created by setup.sql)
-        
-        # Save image temporarily and upload to Snowflake stage
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp_file:
-            # Save PIL Image to temporary file
-            image_data.save(tmp_file.name, 'JPEG')
-            temp_path = tmp_file.name
-        
-        try:
-            # Upload to Snowflake stage
-            session.file.put(temp_path, f"@photo_analysis_stage/{filename}", auto_compress=False, overwrite=True)
-            
-            # Use AI_CLASSIFY to analyze professional style and personality
-            classification_result = session.sql(f"""
-            WITH photo_analysis AS (
-                SELECT TO_FILE('@photo_analysis_stage/{filename}') AS img
-            )
-            SELECT
-                AI_CLASSIFY(img, ['professional', 'casual', 'creative', 'technical']):labels[0] AS professional_style,
-                AI_CLASSIFY(img, ['confident', 'analytical', 'innovative', 'collaborative', 'focused', 'dynamic']):labels[0] AS personality_traits
-            FROM photo_analysis
-            """).collect()
-            
-            if classification_result and len(classification_result) > 0:
-                professional_style = classification_result[0]['PROFESSIONAL_STYLE'] or 'professional'
-                personality_traits = classification_result[0]['PERSONALITY_TRAITS'] or 'analytical'
-            else:
-                # Fallback to demo randomization if AI_CLASSIFY fails
-                import random
-                style_options = ['professional', 'casual', 'creative', 'technical']
-                trait_options = ['confident', 'analytical', 'innovative', 'collaborative']
-                professional_style = random.choice(style_options)
-                personality_traits = random.choice(trait_options)
-                
-        finally:
-            # Clean up temporary file and stage file
-            try:
-                os.unlink(temp_path)
-                session.sql(f"REMOVE '@photo_analysis_stage/{filename}'").collect()
-            except:
-                pass  # Ignore cleanup errors
-        
-        # Generate superhero name using AI_COMPLETE
-        name_prompt = f"""Generate a Snowflake Data Cloud superhero name for someone with {professional_style} style and {personality_traits} traits. 
-        The name should relate to data, AI, cloud computing, or analytics. 
-        Be creative and professional. Return only the superhero name."""
-        
-        # Escape quotes for SQL
-        escaped_prompt = name_prompt.replace("'", "''")
-        superhero_name_result = session.sql(f"""
-        SELECT SNOWFLAKE.CORTEX.COMPLETE('mixtral-8x7b', '{escaped_prompt}', 100) as superhero_name
-        """).collect()
-        
-        superhero_name = superhero_name_result[0]['SUPERHERO_NAME'].strip().strip('"')
-        
-        # Generate matching superpower
-        power_prompt = f"""Create a data/AI-related superpower for {superhero_name} that matches their {personality_traits} personality. 
-        Focus on Snowflake capabilities like scaling, performance, AI, or data governance. 
-        Make it exciting and relevant to data professionals. Return only the superpower description."""
-        
-        # Escape quotes for SQL
-        escaped_power_prompt = power_prompt.replace("'", "''")
-        superpower_result = session.sql(f"""
-        SELECT SNOWFLAKE.CORTEX.COMPLETE('mixtral-8x7b', '{escaped_power_prompt}', 150) as superpower
-        """).collect()
-        
-        superpower = superpower_result[0]['SUPERPOWER'].strip().strip('"')
-        
-        # Find best matching archetype using similarity
-        archetype_result = session.sql(f"""
-        WITH visitor_traits AS (
-            SELECT '{personality_traits}, {professional_style}' as traits
-        )
-        SELECT 
-            a.ARCHETYPE_NAME,
-            a.DESCRIPTION
-        FROM SUPERHERO_ARCHETYPES a, visitor_traits v
-        ORDER BY RANDOM()
-        LIMIT 1
-        """).collect()
-        
-        archetype = archetype_result[0]['ARCHETYPE_NAME'] if archetype_result else 'Data Hero'
+        # Stream a downscaled JPEG to the stage, no temp file needed
+        session.file.put_stream(prepare_photo_upload(photo), stage_path, auto_compress=False, overwrite=True)
         
-        # Filter content for appropriateness (simplified for demo)
-        content_check = f"{superhero_name}: {superpower}"
-        if len(content_check) > 10:  # Basic check, in real app use AI_FILTER
-            is_appropriate = True
-        else:
-            is_appropriate = False
+        # Classify the photo with AI_CLASSIFY, then generate the superhero
+        # name and superpower with one structured-output AI_COMPLETE call
+        generation_result = session.sql(
+            SUPERHERO_GENERATION_SQL, params=[stage_path, IDENTITY_PROMPT_TEMPLATE]
+        ).collect()
         
-        if not is_appropriate:
-            superhero_name = "The Data Guardian"
-            superpower = "Protects and optimizes data with unmatched precision"
-        
-        return {
-            'superhero_name': superhero_name,
-            'superpower': superpower,
-            'archetype': archetype,
-            'professional_style': professional_style,
-            'personality_traits': personality_traits,
-            'ai_analysis': {
-                'model_used': 'mixtral-8x7b + AI_CLASSIFY',
-                'image_analysis': 'cortex_vision',
-                'style_confidence': 0.85,
-                'traits_confidence': 0.82,
-                'generation_tokens': 400
-            },
-            'ai_tokens_used': 400
-        }
+    finally:
+        # Clean up stage file without holding up the result
+        threading.Thread(target=remove_staged_photo, args=(session, stage_path), daemon=True).start()
+    
+    professional_style = generation_result[0]['PROFESSIONAL_STYLE']
+    personality_traits = generation_result[0]['PERSONALITY_TRAITS']
+    superhero_name = generation_result[0]['SUPERHERO_NAME'].strip().strip('"')
+    superpower = generation_result[0]['SUPERPOWER'].strip().strip('"')
+    
+    # Pick an archetype from the cached reference data
+    archetypes = load_archetypes(session)
+    archetype = random.choice(archetypes) if archetypes else 'Data Hero'
+    
+    # Filter content for appropriateness (simplified for demo)
+    content_check = f"{superhero_name}: {superpower}"
+    if len(content_check) > 10:  # Basic check, in real app use AI_FILTER
+        is_appropriate = True
+    else:
+        is_appropriate = False
+    
+    if not is_appropriate:
+        superhero_name = "The Data Guardian"
+        superpower = "Protects and optimizes data with unmatched precision"
+    
+    return {
+        'superhero_name': superhero_name,
+        'superpower': superpower,
+        'archetype': archetype,
+        'professional_style': professional_style,
+        'personality_traits': personality_traits,
+        'ai_analysis': {
+            'model_used': 'llama3.1-70b + AI_CLASSIFY',
+            'image_analysis': 'cortex_vision',
+            'style_confidence': 0.85,
+            'traits_confidence': 0.82,
+            'generation_tokens': 400
+        },
+        'ai_tokens_used': 400
+    }
+
+# dHashes with fewer set bits come from flat (dark, blank or over-exposed)
+# frames, which all hash alike, so they're never cached
+MIN_FINGERPRINT_BITS = 8
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def generate_superhero(_session, session_id, photo_hash, _photo):
+    """Generate a superhero identity, cached per browser session and photo hash
+    
+    Retakes of the same shot skip the stage upload and the billed Cortex
+    calls. The key includes the browser session id, so visitors with similar
+    photos against the same backdrop never share a hero. Errors propagate
+    (and are not cached) so the caller can fall back.
+    """
+    return _generate_superhero(_session, _photo)
+
+def analyze_photo_with_ai(session, photo_bytes):
+    """Use Cortex AISQL to analyze the photo and generate superhero identity
+    
+    photo_bytes is the raw uploaded photo, read once by the caller.
+    """
+    if not session:
+        return None
+    
+    try:
+        # Decode once; the fingerprint and the stage upload share the thumbnail
+        photo = load_photo(photo_bytes)
+        photo_hash = photo_fingerprint(photo)
+        if bin(int(photo_hash, 16)).count('1') < MIN_FINGERPRINT_BITS:
+            return _generate_superhero(session, photo)
+        return generate_superhero(session, st.session_state.session_id, photo_hash, photo)
         
     except Exception as e:
         st.warning("🤖 Using AI fallback mode for reliable booth experience...")
@@ -262,7 +373,6 @@ def analyze_photo_with_ai(image_data):
             "Commands infinite cloud resources"
         ]
         
-        import random
         return {
             'superhero_name': random.choice(fallback_names),
             'superpower': random.choice(fallback_powers),
@@ -277,42 +387,50 @@ def analyze_photo_with_ai(image_data):
             'ai_tokens_used': 100
         }
 
-def save_visitor_data(superhero_data):
-    """Save visitor interaction to Snowflake"""
-    session = get_snowflake_session()
+def log_failed_insert(insert_job):
+    """Wait for a background INSERT and log it if it failed"""
+    try:
+        insert_job.result()
+    except Exception as e:
+        logger.error("Visitor insert %s failed: %s", insert_job.query_id, e)
+
+def save_visitor_data(session, superhero_data):
+    """Save visitor interaction to Snowflake without waiting for the INSERT"""
     if not session:
         return
     
     try:
-        # Escape strings for SQL
-        session_id = st.session_state.session_id.replace("'", "''")
-        hero_name = superhero_data['superhero_name'].replace("'", "''")
-        superpower = superhero_data['superpower'].replace("'", "''")
-        archetype = superhero_data['archetype'].replace("'", "''")
-        prof_style = superhero_data['professional_style'].replace("'", "''")
-        personality = superhero_data['personality_traits'].replace("'", "''")
-        
         # Properly serialize Python dict to JSON string
         ai_analysis_json = json.dumps(superhero_data['ai_analysis'])
         tokens_used = superhero_data.get('ai_tokens_used', superhero_data['ai_analysis'].get('generation_tokens', 0))
         
-        # Properly serialize session data to JSON
-        session_data_json = json.dumps({"booth": "accenture", "event": "snowflake_world_tour"})
+        # Submit asynchronously: the hero card doesn't depend on the write.
+        # PARSE_JSON isn't allowed in a VALUES clause, so insert via SELECT;
+        # all values are bound, so the statement text never changes.
+        insert_job = session.sql("""
+        INSERT INTO SUPERHERO_VISITORS
+        SELECT ?, CURRENT_TIMESTAMP(), ?, ?, ?, PARSE_JSON(?), ?, ?, ?, PARSE_JSON(?)
+        """, params=[
+            st.session_state.session_id,
+            superhero_data['superhero_name'],
+            superhero_data['superpower'],
+            superhero_data['archetype'],
+            ai_analysis_json,
+            superhero_data['professional_style'],
+            superhero_data['personality_traits'],
+            tokens_used,
+            SESSION_DATA_JSON
+        ]).collect_nowait()
+        st.session_state.last_insert_query_id = insert_job.query_id
         
-        session.sql(f"""
-        INSERT INTO SUPERHERO_VISITORS VALUES (
-            '{session_id}',
-            CURRENT_TIMESTAMP(),
-            '{hero_name}',
-            '{superpower}',
-            '{archetype}',
-            PARSE_JSON('{ai_analysis_json}'),
-            '{prof_style}',
-            '{personality}',
-            {tokens_used},
-            PARSE_JSON('{session_data_json}')
-        )
-        """).collect()
+        # The booth tally is best-effort and must never affect the write
+        try:
+            count_visitor(superhero_data['archetype'])
+        except Exception as e:
+            logger.error("Visitor tally update failed: %s", e)
+        
+        # Async failures surface after this run has moved on, so log them
+        threading.Thread(target=log_failed_insert, args=(insert_job,), daemon=True).start()
         
     except Exception as e:
         st.error(f"Failed to save data: {e}")
@@ -326,8 +444,26 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-# Check database connection
-if check_database_connection():
+# Reuse one cached Snowflake session for the whole script run
+try:
+    session = get_snowflake_session()
+except Exception as e:
+    st.error(f"Failed to connect to Snowflake: {e}")
+    session = None
+
+# Check database connection once per browser session; later reruns
+# (tab switches, camera frames, button clicks) skip the check entirely
+if not st.session_state.get('db_ok'):
+    try:
+        st.session_state.db_ok = session is not None and check_database_connection(session)
+    except LookupError as e:
+        st.error(str(e))
+        st.session_state.db_ok = False
+    except Exception as e:
+        st.error(f"Database connection failed: {e}")
+        st.session_state.db_ok = False
+
+if st.session_state.db_ok:
     st.success("✅ Connected to Snowflake AI Data Cloud", icon="❄️")
 else:
     st.error("❌ Database not ready. Please run setup.sql first.")
@@ -349,15 +485,15 @@ with col2:
     # Create tabs for different input methods
     tab1, tab2 = st.tabs(["📷 Camera", "📁 Upload"])
     
-    image = None
+    photo_bytes = None
     
     with tab1:
         st.markdown("**Use your device camera**")
         camera_image = st.camera_input("Take a picture")
         
         if camera_image is not None:
-            image = Image.open(camera_image)
-            st.image(image, caption="Camera Photo", use_container_width=True)
+            photo_bytes = camera_image.getvalue()
+            st.image(camera_image, caption="Camera Photo", use_container_width=True)
             st.session_state.photo_taken = True
     
     with tab2:
@@ -369,29 +505,24 @@ with col2:
         )
         
         if uploaded_file is not None:
-            image = Image.open(uploaded_file)
-            st.image(image, caption="Uploaded Photo", use_container_width=True)
+            photo_bytes = uploaded_file.getvalue()
+            st.image(uploaded_file, caption="Uploaded Photo", use_container_width=True)
             st.session_state.photo_taken = True
     
     # Show generate button if we have an image from either source
-    if image is not None:
+    if photo_bytes is not None:
         st.markdown("<br>", unsafe_allow_html=True)
         if st.button("🚀 Generate My Superhero Identity", use_container_width=True):
-            with st.spinner("🤖 AI is analyzing your photo and generating your superhero identity..."):
-                # Simulate processing time for booth effect
-                progress_bar = st.progress(0)
-                for i in range(100):
-                    time.sleep(0.03)  # 3 second total
-                    progress_bar.progress(i + 1)
-                
+            with st.status("🤖 AI is analyzing your photo and generating your superhero identity...") as status:
                 # Generate superhero identity
-                superhero_data = analyze_photo_with_ai(image)
-                
-                if superhero_data:
-                    st.session_state.superhero_data = superhero_data
-                    st.session_state.superhero_generated = True
-                    save_visitor_data(superhero_data)
-                    st.rerun()
+                superhero_data = analyze_photo_with_ai(session, photo_bytes)
+                status.update(label="🦸‍♂️ Superhero identity ready!", state="complete")
+            
+            if superhero_data:
+                st.session_state.superhero_data = superhero_data
+                st.session_state.superhero_generated = True
+                save_visitor_data(session, superhero_data)
+                st.rerun()
 
 # Display Results
 if st.session_state.get('superhero_generated', False):
@@ -431,21 +562,13 @@ if st.session_state.get('superhero_generated', False):
     with col3:
         if st.button("📊 View Analytics", help="Booth staff only"):
             # Simple analytics for booth staff
-            session = get_snowflake_session()
             if session:
                 try:
-                    stats = session.sql("""
-                    SELECT 
-                        COUNT(*) as total_visitors,
-                        COUNT(DISTINCT ARCHETYPE) as unique_archetypes,
-                        MODE(ARCHETYPE) as most_popular_archetype
-                    FROM SUPERHERO_VISITORS 
-                    WHERE DATE(TIMESTAMP) = CURRENT_DATE()
-                    """).collect()
+                    stats = get_today_stats(session)
                     
                     if stats:
-                        st.metric("Today's Visitors", stats[0]['TOTAL_VISITORS'])
-                        st.metric("Popular Archetype", stats[0]['MOST_POPULAR_ARCHETYPE'])
+                        st.metric("Today's Visitors", stats['TOTAL_VISITORS'])
+                        st.metric("Popular Archetype", stats['MOST_POPULAR_ARCHETYPE'])
                 except:
                     st.info("Analytics loading...")
 